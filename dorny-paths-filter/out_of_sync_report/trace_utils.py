@@ -1,16 +1,21 @@
+import base64
 import os
 import uuid
 import socket
 
+# Process-invariant parts of the trace ID, resolved once per container
+_PID = os.getpid()
+_HOST = socket.gethostname()
+_PREFIX = f"{_PID}@{_HOST}/"
+_SUFFIX = "-" + "0" * 16
+
 def setup_trace_id(logger):
     """
     Generate a trace ID in Node.js style and set it in the logger.
+    The GUID part is the 128-bit UUID4 as 22 URL-safe base64 characters.
     Returns the trace ID string.
     """
-    pid = os.getpid()
-    hostname = socket.gethostname()
-    guid = str(uuid.uuid4())
-    zero_pad = '0'.zfill(16)
-    trace_id = f"{pid}@{hostname}/{guid}-{zero_pad}"
+    guid = base64.urlsafe_b64encode(uuid.uuid4().bytes).rstrip(b'=').decode('ascii')
+    trace_id = _PREFIX + guid + _SUFFIX
     logger.set_trace_id(trace_id)
     return trace_id
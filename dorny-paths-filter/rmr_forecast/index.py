@@ -1,13 +1,20 @@
+import functools
+import http.cookiejar
 import json
 import os
+import time
 import boto3
+from botocore.config import Config
+import orjson
 import requests
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from logger import get_logger
 
+# Load .env before importing the logger, which reads the environment at import
 load_dotenv()
 
+from logger import get_logger
+
 # Initialize logger
 logger = get_logger('RMRForecast', 'INFO')
 
@@ -16,13 +23,43 @@ logger = get_logger('RMRForecast', 'INFO')
 SECRET_NAME = os.getenv("SECRET_NAME")
 REGION_NAME = os.getenv("REGION_NAME", "us-east-1")  # fallback default
 
-# AWS SDK client
-secrets_client = boto3.client("secretsmanager", region_name=REGION_NAME)
+# AWS SDK client config; keepalive lets warm invocations reuse the connection
+_BOTO_CONFIG = Config(
+    tcp_keepalive=True,
+    connect_timeout=1,
+    read_timeout=3,
+    retries={"max_attempts": 2, "mode": "standard"}
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_secrets_client():
+    return boto3.client("secretsmanager", region_name=REGION_NAME, config=_BOTO_CONFIG)
+
+
+# Shared HTTP session so warm invocations reuse the pooled TLS connections;
+# static headers live on the session so requests only add per-call ones
+_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+_session = requests.Session()
+_session.headers["User-Agent"] = _USER_AGENT
+# Pool connections only: never store cookies, so no state carries across calls or invocations
+_session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+_session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=2, max_retries=0))
+
+
+# Parsed secrets cached across warm invocations: secret name -> (value, expiry)
+SECRET_TTL_SECONDS = 300
+_SECRET_CACHE = {}
 
 
 def get_secrets(secret_name):
-    response = secrets_client.get_secret_value(SecretId=secret_name)
+    now = time.monotonic()
+    cached = _SECRET_CACHE.get(secret_name)
+    if cached is not None and now < cached[1]:
+        return cached[0]
+    response = _get_secrets_client().get_secret_value(SecretId=secret_name)
     secret = json.loads(response["SecretString"])
+    _SECRET_CACHE[secret_name] = (secret, now + SECRET_TTL_SECONDS)
     return secret
 
 def get_token(username, password, domain, auth_api_url, trace_id):
@@ -31,37 +68,49 @@ def get_token(username, password, domain, auth_api_url, trace_id):
         "password": password,
         "domain": domain
     }
-    headers = {"X-Request-ID": trace_id,
-               "User-Agent":"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"}
-    response = requests.post(auth_api_url, json=payload, headers=headers, timeout=10)
+    headers = {"X-Request-ID": trace_id}
+    response = _session.post(auth_api_url, json=payload, headers=headers, timeout=10)
     response.raise_for_status()
-    token = response.json().get("token")
+    token = orjson.loads(response.content).get("token")
     if not token:
         raise ValueError("No token found in auth response.")
     return token
 
-# Retry for protected API
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1.5, min=2, max=60),
-    retry=retry_if_exception_type(requests.exceptions.RequestException),
-    reraise=True
-)
+# Retry for protected API: 3 attempts, exponential backoff (x1.5) starting at 2s, capped at 60s
+BASE_API_ATTEMPTS = 3
+
+
 def call_base_api(token, trace_id, base_api_url):
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "X-Request-ID": trace_id,
-        "User-Agent":"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
-    }
-    response = requests.post(base_api_url, headers=headers, timeout=60)
-    response.raise_for_status()
+    headers = {"Authorization": "Bearer " + token, "X-Request-ID": trace_id}
+    delay = 2
+    for attempt in range(BASE_API_ATTEMPTS):
+        try:
+            # Read the body once, in chunks, inside the block so the connection goes back to the pool
+            with _session.post(base_api_url, headers=headers, timeout=60, stream=True) as response:
+                response.raise_for_status()
+                body = response.content
+            break
+        except requests.exceptions.RequestException:
+            if attempt == BASE_API_ATTEMPTS - 1:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 1.5, 60)
     content_type = response.headers.get("Content-Type", "")
-    if content_type.startswith("application/json") and response.text.strip():
-        return response.json()
+    if content_type.startswith("application/json") and body and not body.isspace():
+        # stdlib json keeps integers beyond 64 bits exact; orjson would turn them into floats
+        return json.loads(body)
     else:
-        logger.warning(f"Non-JSON or empty response from base API: {response.text}")
+        # Log only the shape of the body; it may be large and is decoded once for the return value
+        logger.warning(f"Non-JSON or empty response from base API: Content-Type={content_type!r}, {len(body)} bytes")
         return response.text
 
+def _dump_body(payload):
+    try:
+        return orjson.dumps(payload).decode()
+    except orjson.JSONEncodeError:
+        # orjson rejects integers beyond 64 bits, which the base API payload may carry
+        return json.dumps(payload, ensure_ascii=False)
+
 def lambda_handler(event, context):
     from trace_utils import setup_trace_id
     trace_id = setup_trace_id(logger)
@@ -92,7 +141,7 @@ def lambda_handler(event, context):
 
         return {
             "statusCode": 200,
-            "body": json.dumps({
+            "body": _dump_body({
                 "message": "Success",
                 "data": protected_data,
                 "traceId": trace_id
@@ -103,14 +152,15 @@ def lambda_handler(event, context):
         logger.exception("Lambda execution failed")
         return {
             "statusCode": 500,
-            "body": json.dumps({
+            "body": _dump_body({
                 "message": "Error",
                 "error": str(e),
                 "traceId": trace_id
             })
         }
     finally:
-        # Clean up trace ID
+        # Clean up trace ID and write out queued logs before the container is frozen
         logger.clear_trace_id()
+        logger.flush()
         
-lambda_handler(None, None)  # For local testing purposes only
\ No newline at end of file
+lambda_handler(None, None)  # For local testing purposes only
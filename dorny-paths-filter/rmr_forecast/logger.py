@@ -1,9 +1,215 @@
 import logging
 import os
-import json
+import traceback
+from contextvars import ContextVar
 from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import Empty, Queue
 from typing import Optional
 
+import orjson
+
+# Numeric values for the level names accepted by EnvironmentLogger
+_LEVEL_MAP = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+    'CRITICAL': logging.CRITICAL
+}
+
+# Trace ID of the current invocation; context-local, so concurrent handlers do not clash
+_TRACE_ID: ContextVar[Optional[str]] = ContextVar('trace_id', default=None)
+
+# Lambda function name keywords mapped to environments, checked in order
+_LAMBDA_HOTWORDS = (
+    (('prod', 'production'), 'production'),
+    (('staging', 'stage'), 'staging'),
+    (('hotfix',), 'hotfixes')
+)
+
+
+class CustomFormatter(logging.Formatter):
+    """
+    JSON formatter for structured logging with enhanced exception readability
+    """
+    
+    def __init__(self, env: str):
+        self.env = env
+        # (epoch second, ISO prefix up to seconds) of the last formatted record
+        self._ts_cache = (None, '')
+        super().__init__()
+
+    def _timestamp(self, created: float) -> str:
+        # Records arrive in bursts, so rebuild the date part only when the second changes
+        sec = int(created)
+        if sec != self._ts_cache[0]:
+            prefix = datetime.fromtimestamp(sec, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+            self._ts_cache = (sec, prefix)
+        micros = int((created - sec) * 1_000_000)
+        return f"{self._ts_cache[1]}.{micros:06d}+00:00"
+
+    def format(self, record):
+        # Resolved when the record was created; the formatter runs on the listener thread
+        trace_id = record.__dict__.get('trace_id_override')
+
+        log_data = {
+            'timestamp': self._timestamp(record.created),
+            'level': record.levelname,
+            'environment': self.env,
+            'trace_id': trace_id,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'function': record.funcName,
+            'line': record.lineno
+        }
+
+        # Enhanced exception info
+        if record.exc_info and record.exc_info[0] is not None:
+            exc_type, exc_value, exc_tb = record.exc_info
+            # Get root cause safely
+            root_exc = exc_value
+            while root_exc is not None and getattr(root_exc, '__cause__', None):
+                root_exc = root_exc.__cause__
+            # Only format the innermost 10 frames for readability
+            tb_str = ''.join(traceback.format_exception(exc_type, exc_value, exc_tb, limit=-10)).strip()
+            log_data['exception_type'] = exc_type.__name__
+            log_data['exception_message'] = str(exc_value) if exc_value else None
+            log_data['root_cause_type'] = type(root_exc).__name__ if root_exc else None
+            log_data['root_cause_message'] = str(root_exc) if root_exc else None
+            log_data['traceback'] = tb_str
+
+        return orjson.dumps(log_data).decode()
+
+
+class _RecordQueueHandler(QueueHandler):
+    """
+    QueueHandler that owns the background listener writing to the console.
+    Records are enqueued without pre-formatting, so the JSON formatter on the
+    listener thread still sees exc_info and extras.
+    """
+    
+    def __init__(self, handler: logging.Handler):
+        super().__init__(Queue())
+        self.listener = _BatchingQueueListener(self.queue, handler, respect_handler_level=True)
+        self.listener.start()
+        self.listening = True
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Freeze the message now; args may be mutated after the call returns
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.listening:
+            super().emit(record)
+            return
+        # After close() nothing reads the queue, so write synchronously instead
+        try:
+            self.listener.handle(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+    
+    def flush(self) -> None:
+        # Wait for the listener to handle everything queued so far, then write it out
+        if self.listening:
+            thread = self.listener._thread
+            with self.queue.all_tasks_done:
+                while self.queue.unfinished_tasks and thread is not None and thread.is_alive():
+                    self.queue.all_tasks_done.wait(0.1)
+            if thread is None or not thread.is_alive():
+                # The listener died; write what is left from this thread instead of hanging
+                self._drain()
+            self.listener.flush_handlers()
+    
+    def _drain(self) -> None:
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except Empty:
+                return
+            try:
+                if record is not self.listener._sentinel:
+                    self.listener.handle(record)
+            finally:
+                self.queue.task_done()
+    
+    def close(self) -> None:
+        # Also called by logging.shutdown() at interpreter exit
+        self.acquire()
+        try:
+            if self.listening:
+                self.listener.stop()
+                # Anything the listener did not get to (e.g. it died) is written here
+                self._drain()
+                self.listening = False
+        finally:
+            self.release()
+        super().close()
+
+
+class _BatchingStreamHandler(logging.StreamHandler):
+    """
+    StreamHandler that buffers formatted records and writes them to the
+    stream in one call on flush, instead of one write per record.
+    The buffer is written out early once it reaches max_records or max_chars.
+    """
+    
+    def __init__(self, stream=None, max_records: int = 100, max_chars: int = 64 * 1024):
+        super().__init__(stream)
+        self.max_records = max_records
+        self.max_chars = max_chars
+        self._pending = []
+        self._pending_chars = 0
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            line = self.format(record) + self.terminator
+            self._pending.append(line)
+            self._pending_chars += len(line)
+            # Bound how much output a steady stream of records can hold back
+            if len(self._pending) >= self.max_records or self._pending_chars >= self.max_chars:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+    
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._pending:
+                # Swap the batch out first so a failed write drops it instead of retrying it forever
+                pending = self._pending
+                self._pending = []
+                self._pending_chars = 0
+                self.stream.write(''.join(pending))
+            super().flush()
+        finally:
+            self.release()
+
+
+class _BatchingQueueListener(QueueListener):
+    """QueueListener that flushes its handlers whenever the queue has been drained"""
+    
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        if self.queue.empty():
+            self.flush_handlers(record)
+    
+    def stop(self) -> None:
+        super().stop()
+        # The sentinel is still queued when the last record is handled
+        self.flush_handlers()
+    
+    def flush_handlers(self, record: Optional[logging.LogRecord] = None) -> None:
+        # A failed write must not kill the listener thread
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                handler.handleError(record)
+
 
 class EnvironmentLogger:
     """
@@ -29,55 +235,60 @@ class EnvironmentLogger:
         self.logger = logging.getLogger(logger_name)
         self.logger.setLevel(getattr(logging, level.upper()))
         
-        # Clear existing handlers to avoid duplicates
-        self.logger.handlers.clear()
+        # Environment must be known before the formatter captures it
+        self.environment = _DETECTED_ENV
         
-        # Set up console handler with custom formatter
-        console_handler = logging.StreamHandler()
-        formatter = self._create_formatter()
-        console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        # Instances sharing a logger name share its queue handler and listener
+        self._handler = next(
+            (h for h in self.logger.handlers if isinstance(h, _RecordQueueHandler) and h.listening),
+            None
+        )
+        if self._handler is None:
+            # Clear existing handlers to avoid duplicates
+            self.logger.handlers.clear()
+            
+            # Set up console handler with custom formatter
+            console_handler = _BatchingStreamHandler()
+            formatter = self._create_formatter()
+            console_handler.setFormatter(formatter)
+            
+            # Write to the console from a background thread so callers never block on I/O;
+            # records that arrive together are written out in a single batch
+            self._handler = _RecordQueueHandler(console_handler)
+            self.logger.addHandler(self._handler)
         
         # Prevent propagation to avoid duplicate logs
         self.logger.propagate = False
         
-        self.environment = self._detect_environment()
-        self.current_trace_id: Optional[str] = None
+        # Cache bound log methods to avoid a getattr per log call
+        self._log_methods = {lv: getattr(self.logger, lv.lower()) for lv in _LEVEL_MAP}
     
-    def _detect_environment(self) -> str:
+    @classmethod
+    def _detect_environment(cls) -> str:
         """
         Detect the current environment from various sources
         
         Returns:
             Environment name (development, staging, hotfixes, production)
         """
-        # Check environment variables in order of priority
-        env_sources = [
-            os.getenv('ENVIRONMENT'),
-            os.getenv('ENV'),
-            os.getenv('STAGE'),
-            os.getenv('AWS_LAMBDA_FUNCTION_NAME'),  # For Lambda detection
-            'development'  # Default fallback
-        ]
+        # First set environment variable wins, in order of priority
+        env = (
+            os.getenv('ENVIRONMENT')
+            or os.getenv('ENV')
+            or os.getenv('STAGE')
+            or os.getenv('AWS_LAMBDA_FUNCTION_NAME')  # For Lambda detection
+            or 'development'  # Default fallback
+        ).lower().strip()
         
-        for env_var in env_sources:
-            if env_var:
-                # Extract environment from Lambda function name if present
-                if 'lambda' in env_var.lower():
-                    if 'prod' in env_var.lower() or 'production' in env_var.lower():
-                        return 'production'
-                    elif 'staging' in env_var.lower() or 'stage' in env_var.lower():
-                        return 'staging'
-                    elif 'hotfix' in env_var.lower():
-                        return 'hotfixes'
-                    else:
-                        return 'development'
-                
-                # Direct environment mapping
-                env_lower = env_var.lower().strip()
-                return self.ENV_MAPPING.get(env_lower, 'development')
+        # Extract environment from Lambda function name if present
+        if 'lambda' in env:
+            for hotwords, name in _LAMBDA_HOTWORDS:
+                if any(word in env for word in hotwords):
+                    return name
+            return 'development'
         
-        return 'development'
+        # Direct environment mapping
+        return cls.ENV_MAPPING.get(env, 'development')
     
     def _create_formatter(self) -> logging.Formatter:
         """
@@ -85,42 +296,7 @@ class EnvironmentLogger:
         Returns:
             Custom logging formatter
         """
-        import traceback
-        class CustomFormatter(logging.Formatter):
-            def format(self, record):
-                logger_instance = record.__dict__.get('logger_instance')
-                trace_id = getattr(logger_instance, 'current_trace_id', None) if logger_instance else None
-
-                log_data = {
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                    'level': record.levelname,
-                    'environment': getattr(logger_instance, 'environment', 'unknown') if logger_instance else 'unknown',
-                    'trace_id': trace_id,
-                    'logger': record.name,
-                    'message': record.getMessage(),
-                    'module': record.module,
-                    'function': record.funcName,
-                    'line': record.lineno
-                }
-
-                # Enhanced exception info
-                if record.exc_info:
-                    exc_type, exc_value, exc_tb = record.exc_info
-                    # Get root cause safely
-                    root_exc = exc_value
-                    while root_exc is not None and getattr(root_exc, '__cause__', None):
-                        root_exc = root_exc.__cause__
-                    # Truncate traceback to last 10 lines for readability
-                    tb_lines = traceback.format_exception(exc_type, exc_value, exc_tb) if exc_type else []
-                    tb_str = ''.join(tb_lines[-10:]).strip() if tb_lines else ''
-                    log_data['exception_type'] = exc_type.__name__ if exc_type else None
-                    log_data['exception_message'] = str(exc_value) if exc_value else None
-                    log_data['root_cause_type'] = type(root_exc).__name__ if root_exc else None
-                    log_data['root_cause_message'] = str(root_exc) if root_exc else None
-                    log_data['traceback'] = tb_str
-
-                return json.dumps(log_data, ensure_ascii=False)
-        return CustomFormatter()
+        return CustomFormatter(self.environment)
     
     def set_trace_id(self, trace_id: str) -> None:
         """
@@ -129,76 +305,68 @@ class EnvironmentLogger:
         Args:
             trace_id: The trace ID to include in logs
         """
-        self.current_trace_id = trace_id
+        _TRACE_ID.set(trace_id)
     
     def clear_trace_id(self) -> None:
         """Clear the current trace ID"""
-        self.current_trace_id = None
+        _TRACE_ID.set(None)
+    
+    @property
+    def current_trace_id(self) -> Optional[str]:
+        """Trace ID set for the current context, if any"""
+        return _TRACE_ID.get()
     
-    def _log_with_context(self, level: str, message: str, trace_id: Optional[str] = None, **kwargs) -> None:
+    def flush(self) -> None:
         """
-        Internal method to log with full context
-        
-        Args:
-            level: Log level
-            message: Log message
-            trace_id: Optional trace ID (overrides current trace ID)
-            **kwargs: Additional context to include
+        Write out all queued log records and keep logging available.
+        Call before a Lambda invocation returns so the container can be frozen safely.
         """
-        # Use provided trace_id or fall back to current trace_id
-        effective_trace_id = trace_id or self.current_trace_id
-        
-        # Temporarily set trace_id for this log call
-        old_trace_id = self.current_trace_id
-        self.current_trace_id = effective_trace_id
-        
-        # Add logger instance to record for formatter access
-        extra = {'logger_instance': self, **kwargs}
-        
-        # Log the message
-        getattr(self.logger, level.lower())(message, extra=extra)
-        
-        # Restore original trace_id
-        self.current_trace_id = old_trace_id
+        self._handler.flush()
+    
+    def shutdown(self) -> None:
+        """Write out all queued log records and stop the background listener"""
+        self._handler.close()
+    
+    def _extra(self, trace_id: Optional[str], kwargs: dict) -> dict:
+        """Build the record extras: effective trace_id for formatter access"""
+        return {'trace_id_override': trace_id or _TRACE_ID.get(), **kwargs}
     
     def debug(self, message: str, trace_id: Optional[str] = None, **kwargs) -> None:
         """Log debug message"""
-        self._log_with_context('DEBUG', message, trace_id, **kwargs)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log_methods['DEBUG'](message, extra=self._extra(trace_id, kwargs))
     
     def info(self, message: str, trace_id: Optional[str] = None, **kwargs) -> None:
         """Log info message"""
-        self._log_with_context('INFO', message, trace_id, **kwargs)
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log_methods['INFO'](message, extra=self._extra(trace_id, kwargs))
     
     def warning(self, message: str, trace_id: Optional[str] = None, **kwargs) -> None:
         """Log warning message"""
-        self._log_with_context('WARNING', message, trace_id, **kwargs)
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log_methods['WARNING'](message, extra=self._extra(trace_id, kwargs))
     
     def error(self, message: str, trace_id: Optional[str] = None, **kwargs) -> None:
         """Log error message"""
-        self._log_with_context('ERROR', message, trace_id, **kwargs)
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log_methods['ERROR'](message, extra=self._extra(trace_id, kwargs))
     
     def critical(self, message: str, trace_id: Optional[str] = None, **kwargs) -> None:
         """Log critical message"""
-        self._log_with_context('CRITICAL', message, trace_id, **kwargs)
+        if self.logger.isEnabledFor(logging.CRITICAL):
+            self._log_methods['CRITICAL'](message, extra=self._extra(trace_id, kwargs))
     
     def exception(self, message: str, trace_id: Optional[str] = None, **kwargs) -> None:
         """Log exception with traceback"""
-        # Use provided trace_id or fall back to current trace_id
-        effective_trace_id = trace_id or self.current_trace_id
-        
-        # Temporarily set trace_id for this log call
-        old_trace_id = self.current_trace_id
-        self.current_trace_id = effective_trace_id
-        
-        # Add logger instance to record for formatter access
-        extra = {'logger_instance': self, **kwargs}
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
         
         # Log the exception
-        self.logger.exception(message, extra=extra)
-        
-        # Restore original trace_id
-        self.current_trace_id = old_trace_id
+        self.logger.exception(message, extra=self._extra(trace_id, kwargs))
+
 
+# Environment variables do not change within a process, so detect once at import
+_DETECTED_ENV = EnvironmentLogger._detect_environment()
 
 # Create a default logger instance
 default_logger = EnvironmentLogger('RMRForecast')
@@ -229,6 +397,16 @@ def clear_trace_id() -> None:
     default_logger.clear_trace_id()
 
 
+def flush() -> None:
+    """Flush queued records on the default logger"""
+    default_logger.flush()
+
+
+def shutdown() -> None:
+    """Stop the background listener on the default logger"""
+    default_logger.shutdown()
+
+
 def debug(message: str, trace_id: Optional[str] = None, **kwargs) -> None:
     """Log debug message using default logger"""
     default_logger.debug(message, trace_id, **kwargs)